@@ -1,17 +1,37 @@
 """ Functions to crawl and process a Wikimedia
 stub-meta-history XML dump into CSV files"""
 
-from base64 import b64encode, b64decode
 from collections import defaultdict
-from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 from hashlib import sha1
-from os import mkdir
-from os.path import exists, join
+from html import unescape
+from mmap import ACCESS_READ, mmap
+from os import cpu_count, listdir, mkdir
+from os.path import exists, getsize, join
+from queue import Empty, Queue, SimpleQueue
+from shutil import copyfileobj, rmtree
+from sys import intern
+from tempfile import mkdtemp
+from threading import Event, Thread
+from time import strftime
+
+try:
+    from pybase64 import b64decode, b64encode_as_string
+except ImportError:
+    from base64 import b64decode, b64encode
+
+    def b64encode_as_string(s):
+        """Stand-in for pybase64.b64encode_as_string
+        when pybase64 is not installed."""
+        return b64encode(s).decode("ascii")
 
 
 class Revision:
     """Holds data from a <revision> tag"""
 
+    __slots__ = ("revid", "pagename", "month", "user", "sha1",
+                 "timestamp", "parent", "linecount")
+
     def __init__(self, crawler):
         self.revid = None
         self.pagename = None
@@ -22,6 +42,17 @@ class Revision:
         self.parent = crawler
         self.linecount = 0
 
+    def clear(self):
+        """Reset per-revision data so the object
+        can be reused for the next <revision>."""
+        self.revid = None
+        self.pagename = None
+        self.month = None
+        self.user = None
+        self.sha1 = None
+        self.timestamp = None
+        self.linecount = 0
+
     def log(self, message):
         """ Write an error message to log,
         or to console if not attached to Crawler."""
@@ -43,7 +74,7 @@ class Revision:
     def add_month(self, timestamp):
         """Add month to Revision.
         Complain if it already has one."""
-        month = timestamp[:7]
+        month = intern(timestamp[:7])
         if self.month is None:
             self.month = month
         else:
@@ -55,16 +86,17 @@ class Revision:
 class Page:
     """Holds data from a <page> tag"""
 
+    __slots__ = ("name", "page_id", "namespace", "is_redirect", "parent",
+                 "user_months", "new_users")
+
     def __init__(self, crawler=None):
         self.name = None
         self.page_id = None
         self.namespace = None
         self.is_redirect = False
         self.parent = crawler
-        self.user_months = defaultdict(int)
-        self.user_ids = set()
-        self.hashes = set()
-        self.users = {}
+        self.user_months = defaultdict(lambda: defaultdict(int))
+        self.new_users = []  # written out at </page>
 
     def log(self, message):
         """ Write an error message to log,
@@ -83,17 +115,15 @@ class Page:
             self.log(message)
             return
         name = self.name.encode("utf-8")
-        base64_name = b64encode(name).decode("utf-8")
-        is_redirect = str(int(self.is_redirect))
-        pieces = (self.page_id, self.namespace,
-                  base64_name, is_redirect)
-        csv = ",".join(pieces)
+        base64_name = b64encode_as_string(name)
+        is_redirect = "1" if self.is_redirect else "0"
+        csv = f"{self.page_id},{self.namespace},{base64_name},{is_redirect}"
         return csv
 
     def from_csv(self, csv_line):
         """Restore page ID and name from CSV"""
         csv_line = csv_line.strip()
-        pieces = csv_line.split(",")
+        pieces = csv_line.split(",", 3)
         page_id, namespace, encoded_name, is_redirect = pieces
         name = b64decode(encoded_name).decode("utf-8")
         self.name = name
@@ -101,19 +131,6 @@ class Page:
         self.namespace = namespace
         self.is_redirect = bool(int(is_redirect))
 
-    def is_revert(self, revision):
-        """Determine if page is an exact hash
-        duplicate of a previous revision of
-        the same page. Not yet used."""
-        if not revision.sha1:
-            m = "Missing SHA1 for revision {}"
-            message = m.format(revision.revid)
-            self.log(message)
-        if revision.sha1 in self.hashes:
-            return True
-        else:
-            return False
-
     def add_id(self, page_id):
         """Add ID to page, and complain if page
         already has one."""
@@ -124,44 +141,45 @@ class Page:
             message = m.format(self.page_id, page_id)
             self.log(message)
 
-    def add_user(self, user, revision):
-        """Add user to Page's user_ids and 'users' dict,
-        if not present, and increment user_months"""
+    def add_user(self, user, month):
+        """Increment user_months for user
+        in the given month"""
         if user.ip:
-            user_id = "IP:" + user.ip
+            user_id = intern("IP:" + user.ip)
         else:
-            user_id = user.user_id
-        if user_id not in self.user_ids:
-            self.user_ids.add(user_id)
-            self.users[user_id] = user
-        month = revision.month
-        key = (month, user_id)  # month-first for sorting
-        self.user_months[key] += 1
+            user_id = intern(user.user_id)
+        # month-first for sorting
+        self.user_months[month][user_id] += 1
 
     def get_user_page_months(self):
-        """Return a list of CSV lines in this format:
+        """Return a {year : rows} dict of UTF-8 encoded
+        CSV lines, without line endings, in this format:
         user_id,page_id,namespace,is_redirect,month,count
+        Year is "" unless the parent splits by year.
         """
         if not self.user_months:
             m = "Page ID {} has no revisions"
             message = m.format(self.page_id)
             self.log(message)
         user_months_by_year = defaultdict(list)
-        user_months = self.user_months.keys()
-        for month, user_id in user_months:
-            count = self.user_months[(month, user_id)]
-            year = ""
-            if self.parent:
-                if self.parent.split_by_year:
-                    year = month[:4]
-            if user_id.startswith("IP:"):
-                if self.parent is not None:
-                    ip = user_id[3:]
-                    user_id = self.parent.ip2id[ip]
-            pieces = (user_id, self.page_id, self.namespace,
-                      str(int(self.is_redirect)), month, str(count))
-            new_line = ",".join(pieces)
-            user_months_by_year[year].append(new_line)
+        page_id = self.page_id
+        namespace = self.namespace
+        is_redirect = "1" if self.is_redirect else "0"
+        ip2id = None
+        year_length = 0  # month[:0] gives the "" year
+        if self.parent is not None:
+            ip2id = self.parent.ip2id
+            if self.parent.split_by_year:
+                year_length = 4
+        for month, user_counts in self.user_months.items():
+            lines = user_months_by_year[month[:year_length]]
+            # fields between user_id and count are fixed per month
+            middle = f",{page_id},{namespace},{is_redirect},{month},"
+            for user_id, count in user_counts.items():
+                if ip2id is not None and user_id.startswith("IP:"):
+                    user_id = ip2id[user_id[3:]]
+                new_line = f"{user_id}{middle}{count}"
+                lines.append(new_line.encode("utf-8"))
         return user_months_by_year
 
 
@@ -188,7 +206,8 @@ class User:
         (user_id,encoded_name). Encode name using 
         base-64 encoding. For IP users, user_id is 
         a sequential identifier and encoded_name is 
-        the existing SHA1 hash of the IP address."""
+        the existing SHA1 hash of the IP address, as an
+        unpadded base-64 digest."""
         if not self.name:
             m = "User ID {} has no name"
             message = m.format(self.user_id)
@@ -197,16 +216,15 @@ class User:
         if self.ip:
             encoded_name = self.name
         else:
-            encoded_name = b64encode(self.name.encode("utf-8"))
-            encoded_name = encoded_name.decode("utf-8")
-        pieces = (self.user_id, encoded_name)
-        csv = ",".join(pieces)
+            encoded_name = b64encode_as_string(self.name.encode("utf-8"))
+        csv = f"{self.user_id},{encoded_name}"
         return csv
 
     def from_csv(self, csv):
         """Add values from user CSV line as
-        generated by self.to_csv()."""
-        user_id, encoded_name = csv.split(",")
+        generated by self.to_csv(). IP user names
+        are kept as their hashed form."""
+        user_id, encoded_name = csv.split(",", 1)
         self.user_id = user_id
         if user_id.startswith("IP:"):
             self.name = encoded_name
@@ -234,6 +252,48 @@ class User:
             self.log(message)
 
 
+class DumpSlice:
+    """Read-only file-like view of the pages between
+    two byte offsets of a dump."""
+
+    def __init__(self, filepath, start, end):
+        self.handle = open(filepath, "rb", buffering=0)
+        self.handle.seek(start)
+        self.remaining = end - start
+
+    @property
+    def closed(self):
+        """Whether the underlying dump
+        file has been closed."""
+        return self.handle.closed
+
+    def read(self, size):
+        """Return up to size bytes of the slice,
+        or b"" once it is exhausted."""
+        if self.remaining <= 0:
+            return b""
+        data = self.handle.read(min(size, self.remaining))
+        self.remaining -= len(data)
+        if not data:
+            self.remaining = 0
+        return data
+
+    def close(self):
+        """Close the underlying dump file.
+        Further reads will fail."""
+        self.handle.close()
+
+    def __enter__(self):
+        """Return the slice itself, for
+        use in a with statement."""
+        return self
+
+    def __exit__(self, *exc_info):
+        """Close the slice on leaving a with
+        statement, whether or not it raised."""
+        self.close()
+
+
 class Crawler:
     """Crawls through XML dump while writing
     extracted user, page, and user-page-month
@@ -252,18 +312,33 @@ class Crawler:
         self.mainspace_only = mainspace_only
         self.overwrite = overwrite
         self.handle = None
+        self.byte_range = None  # (start, end) to crawl a slice only
         self.user_ids = set()
-        self.ips = set()
         self.ip_count = -1  # start from 0 not 1
         self.ip2id = {}
         self.loghandle = None
+        self.log_queue = SimpleQueue()
+        self.log_thread = None
         self.maxlines = None
         self.linecount = 0
         self.revcount = 0
+        self.progress_interval = 5000000
+        self.next_progress_log = self.progress_interval
         self.deleted_user_edits = 0
         self.current_page = None
         self.current_revision = None
         self.current_user = None
+        self.spare_revision = Revision(crawler=self)
+        self.start_handlers = {"revision": self.start_revision,
+                               "contributor": self.start_contributor,
+                               "redirect": self.start_redirect}
+        self.text_handlers = {"id": self.process_id_tag,
+                              "username": self.process_username_tag,
+                              "ip": self.process_ip_tag,
+                              "timestamp": self.process_timestamp_tag,
+                              "sha1": self.process_sha1_tag,
+                              "ns": self.process_ns_tag,
+                              "title": self.process_title_tag}
         self.output_headers = {"users_output": ("user_id", "user_name"),
                                "user_page_months_output": ("user_id", "page_id",
                                                            "page_namespace", "page_is_redirect",
@@ -273,6 +348,12 @@ class Crawler:
                                }
         self.output_directory = output_directory
         self.active_outputs = {}
+        self.output_buffers = {}
+        self.flush_size = 1 << 20
+        # set by crawl() when outputs never change:
+        self.users_buffer = None
+        self.pages_buffer = None
+        self.rows_buffer = None
 
     def activate_outputs(self, year=None):
         """Open files to be used for CSV output.
@@ -296,23 +377,31 @@ class Crawler:
             if not overwrite:
                 if not exists(filepath):
                     overwrite = True
-            handle = open(filepath, mode, encoding="utf-8")
+            handle = open(filepath, mode + "b", buffering=1 << 20)
             self.active_outputs[filename] = handle
+            self.output_buffers[filename] = bytearray()
             if overwrite is True:
                 fields = self.output_headers[name]
                 first_line = ",".join(fields) + "\n"
-                handle.write(first_line)
+                handle.write(first_line.encode("utf-8"))
 
     def close_outputs(self):
-        """Close the CSV output files."""
+        """Flush buffered lines and close
+        the CSV output files."""
         for name, output in self.active_outputs.items():
             try:
+                buf = self.output_buffers[name]
+                output.write(buf)
+                buf.clear()
                 output.close()
             except Exception as e:
                 m = "Error in closing output {}: {}"
                 message = m.format(name, str(e))
                 self.log(message)
             self.active_outputs[name] = None
+        self.users_buffer = None
+        self.pages_buffer = None
+        self.rows_buffer = None
 
     def log(self, message):
         """Write message to log, and optionally
@@ -321,33 +410,45 @@ class Crawler:
             m = "Error! Blank message"
             message = m.format(self.linecount)
         message += " at line {}".format(self.linecount)
+        if self.log_thread is None:
+            self.write_log(message)
+        else:
+            self.log_queue.put(message)
+
+    def write_log(self, message):
+        """Write finished message to console
+        and/or log file."""
         if self.log_to_console:
             print(message)
         if self.loghandle is not None:
             self.loghandle.write(message + "\n")
 
-    def get_oneline_tag(self, text):
-        """Get content of a tag that is expected
-        to all be in a single line."""
-        try:
-            content = text.split(">", 1)[1]
-        except IndexError:
-            m = "Problem with one-line tag: {}"
-            message = m.format(text)
-            self.log(message)
-            return ""
-        tag_pieces = content.split("<", 1)
-        if len(tag_pieces) != 2:
-            m = "Problem with one-line tag: {}"
-            message = m.format(text)
-            self.log(message)
-            return ""
-        tag_content = tag_pieces[0]
-        tag_content = tag_content.strip(" ") # avoid stripping whitespace that may be valid title
-        return tag_content
+    def log_worker(self):
+        """Write queued messages until a None
+        sentinel arrives. Runs in log_thread."""
+        while True:
+            message = self.log_queue.get()
+            if message is None:
+                break
+            self.write_log(message)
+
+    def start_log_thread(self):
+        """Hand log writes off to a background
+        thread so the parser does not wait on them."""
+        self.log_thread = Thread(target=self.log_worker, daemon=True)
+        self.log_thread.start()
+
+    def stop_log_thread(self):
+        """Wait for queued messages to be written,
+        then go back to writing them directly."""
+        if self.log_thread is None:
+            return
+        self.log_queue.put(None)
+        self.log_thread.join()
+        self.log_thread = None
 
     def reset_page(self):
-        """Write data, add new user ids, and clean up.
+        """Write data and clean up.
         To be called upon reaching </page>"""
         if self.current_page is not None:
             if self.current_user is not None:
@@ -360,7 +461,8 @@ class Crawler:
                 message = m.format(self.current_page.page_id,
                                    self.current_revision.revid)
                 self.log(message)
-            self.add_users()
+            for user in self.current_page.new_users:
+                self.write_user(user)
             self.write_current_page_months()
             self.write_current_page()
         self.current_page = None
@@ -370,79 +472,97 @@ class Crawler:
     def reset_revision(self):
         """Store user and rev data and
         clean up after </revision>"""
-        if self.current_page is not None:
-            if self.current_revision is not None:
-                if self.current_user is None:
+        page = self.current_page
+        rev = self.current_revision
+        if page is not None:
+            if rev is not None:
+                user = self.current_user
+                if user is None:
                     m = "Warning: revision {} has no user"
-                    message = m.format(self.current_revision.revid)
+                    message = m.format(rev.revid)
                     self.log(message)
                 else:
-                    rev = self.current_revision
-                    user = self.current_user
-                    self.current_page.add_user(user, rev)
-        self.revcount += 1
-        if not self.revcount % 5000000:
-            now = datetime.today().isoformat()
+                    if user.is_new:
+                        self.add_user(user, page)
+                    page.add_user(user, rev.month)
+        revcount = self.revcount + 1
+        self.revcount = revcount
+        if revcount >= self.next_progress_log:
+            self.next_progress_log += self.progress_interval
+            now = get_timestamp()
             m = "Reached revision {} at {}"
-            message = m.format(self.revcount, now)
+            message = m.format(revcount, now)
             self.log(message)
         self.current_revision = None
         self.current_user = None
 
     def get_id_and_name_for_ip(self, ip):
         """For new unique IP address, return a sequential
-        ID and an SHA1 hash to use as a user name.
-        Called only from write_user() after filtering
+        ID and an SHA1 hash to use as a user name. The
+        hash is the raw digest in unpadded base-64 (27
+        characters) rather than 40 hex digits.
+        Called only from add_user() after filtering
         out any non-new IPs."""
         self.ip_count += 1
         user_id = "IP:{}".format(self.ip_count)
         self.ip2id[ip] = user_id
-        hashed_ip = sha1(ip.encode("utf-8"))
-        user_name = hashed_ip.hexdigest()
+        user_name = hash_ip(ip)
         return user_id, user_name
 
-    def add_users(self):
-        """Add users from current_page.
-        If user already there, do nothing."""
-        for user in self.current_page.users.values():
-            if not user.is_new:
-                continue
-            if not user.ip:
-                self.user_ids.add(user.user_id)
-            self.write_user(user)
+    def add_user(self, user, page):
+        """Record a user not seen before, so later
+        revisions by them are not new, and hold them
+        on page until it is written out."""
+        if user.ip:
+            user_id, name = self.get_id_and_name_for_ip(user.ip)
+            user.user_id = user_id
+            user.add_name(name)
+        else:
+            self.user_ids.add(user.user_id)
+        page.new_users.append(user)
 
-    def get_output(self, output_name, year=None):
+    def write_output_line(self, 
+                          output_name, 
+                          line,
+                          year=None,
+                          buf=None):
+        """Add provided line, which must not already end
+        in a newline, to the buffer for specified output,
+        writing the buffer out once it exceeds flush_size
+        bytes. Callers that already hold the output's
+        buffer can pass it as buf to skip looking it up."""
+        if buf is None:
+            buf = self.get_output_buffer(output_name, year=year)
+        buf.extend(line.encode("utf-8"))
+        buf.append(10)
+        self.flush_if_full(output_name, buf, year=year)
+
+    def get_output_buffer(self, output_name, year=None):
         """Given an output name such as 'users_output',
-        return the correct open output file"""
+        return the bytearray buffering lines for the
+        correct output file."""
         output_filename = get_output_filename(output_name, year)
-        active_outputs = self.active_outputs.keys()
-        if output_filename not in active_outputs:
+        buf = self.output_buffers.get(output_filename)
+        if buf is None:
             self.activate_outputs(year=year)
-        output = self.active_outputs[output_filename]
-        return output
+            buf = self.output_buffers[output_filename]
+        return buf
 
-    def write_output_line(self, 
-                          output_name, 
-                          line,
-                          year=None):
-        """Write provided line to specified output."""
-        output_file = self.get_output(output_name, year=year)
-        if not line.endswith("\n"):
-            line += "\n"
-        output_file.write(line)
+    def flush_if_full(self, output_name, buf, year=None):
+        """Write out and clear buf, the buffer for
+        specified output, if it exceeds flush_size."""
+        if len(buf) > self.flush_size:
+            output_filename = get_output_filename(output_name, year)
+            self.active_outputs[output_filename].write(buf)
+            buf.clear()
 
     def write_user(self, user):
         """Write user info to users_output as CSV
         in format: (user_id, encoded_name)"""
-        if user.ip:
-            if user.is_new:
-                user_id, name = self.get_id_and_name_for_ip(user.ip)
-                user.user_id = user_id
-                user.add_name(name)
-                self.ips.add(user.ip)
         csv = user.to_csv()
         if csv:
-            self.write_output_line("users_output", csv)
+            self.write_output_line("users_output", csv,
+                                   buf=self.users_buffer)
         else:
             message = "Warning: blank user CSV" 
             self.log(message)
@@ -457,16 +577,15 @@ class Crawler:
             message = m.format(self.current_page.page_id)
             self.log(message)
             return
-        for year, csv_lines in lines_by_year.items():
-            if len(set([x.count(",") for x in csv_lines])) != 1:
-                # there should be no extra or missing commas
-                m = "Problem with user-page-months CSV: \n{}\n"
-                message = m.format(csv_lines)
-                self.log(message)
-                return
-            csv = "\n".join(csv_lines)
-            output = "user_page_months_output"
-            self.write_output_line(output, csv, year=year)
+        output = "user_page_months_output"
+        for year, rows in lines_by_year.items():
+            buf = self.rows_buffer
+            if buf is None:
+                buf = self.get_output_buffer(output, year=year)
+            for row in rows:
+                buf.extend(row)
+                buf.append(10)
+            self.flush_if_full(output, buf, year=year)
 
     def write_current_page(self):
         """Write CSV of current_page info to respective
@@ -476,7 +595,8 @@ class Crawler:
             message = "Warning: blank page CSV"
             self.log(message)
         else:
-            self.write_output_line("pages_output", page_csv)
+            self.write_output_line("pages_output", page_csv,
+                                   buf=self.pages_buffer)
 
     def process_id_tag(self, this_id):
         """Process an ID, which may be of the current
@@ -496,9 +616,59 @@ class Crawler:
     def process_ip_tag(self, ip):
         """Process an <ip> tag"""
         self.current_user.ip = ip
-        if ip not in self.ips:
+        if ip not in self.ip2id:
             self.current_user.is_new = True
-    
+
+    def process_username_tag(self, username):
+        """Process a <username> tag"""
+        if "&" in username:
+            username = unescape(username)
+        self.current_user.add_name(username)
+
+    def process_timestamp_tag(self, timestamp):
+        """Process a <timestamp> tag"""
+        self.current_revision.add_month(timestamp)
+
+    def process_sha1_tag(self, hashed):
+        """Process a <sha1> tag"""
+        self.current_revision.sha1 = hashed
+
+    def process_ns_tag(self, namespace):
+        """Process an <ns> tag, dropping the current
+        page if only mainspace is wanted."""
+        namespace = intern(namespace)
+        self.current_page.namespace = namespace
+        if namespace != "0":
+            if self.mainspace_only:
+                self.current_page = None
+
+    def process_title_tag(self, title):
+        """Process a <title> tag"""
+        if "&" in title:
+            title = unescape(title)
+        if title != "":
+            self.current_page.name = title
+
+    def start_revision(self, tag):
+        """Process a <revision> opening tag, reusing
+        one Revision since none outlives its tag."""
+        revision = self.spare_revision
+        revision.clear()
+        self.current_revision = revision
+
+    def start_contributor(self, tag):
+        """Process a <contributor> opening tag,
+        which may mark a deleted user."""
+        if tag.startswith("contributor deleted"):
+            self.create_deleted_user()
+            self.deleted_user_edits += 1
+        else:
+            self.current_user = User(crawler=self)
+
+    def start_redirect(self, tag):
+        """Process a <redirect> tag"""
+        self.current_page.is_redirect = True
+
     def create_deleted_user(self):
         """Create dummy user as current_user
         for revisions with attribution removed."""
@@ -507,79 +677,124 @@ class Crawler:
         user.name = "[Attribution Removed]"
         self.current_user = user
 
-    def process_line(self, line):
-        """Process a single line from
-        stub-meta-history dump."""
-        line = line.lstrip()
-        if not line:
-            return
-        if line[0] != "<":
-            return
-        if line[1] == "/":
-            if line.startswith("</revision>"):
+    def process_lines(self, lines, linecount):
+        """Process lines from the stub-meta-history dump,
+        the first being line number linecount + 1. Tags are
+        assumed to be one per line, as they are in dumps.
+        self.linecount is only kept up to date for lines
+        with a handler, for the line numbers logged."""
+        start_handlers = self.start_handlers
+        text_handlers = self.text_handlers
+        for line in lines:
+            linecount += 1
+            tagname, _, text = line.partition(">")
+            tagname = tagname.lstrip(" <")
+            handler = text_handlers.get(tagname)
+            if handler is not None:
+                if self.current_page is not None:
+                    self.linecount = linecount
+                    handler(text.partition("<")[0].strip(" "))
+                continue
+            if tagname == "/revision":
+                self.linecount = linecount
                 self.reset_revision()
-            elif line.startswith("</page>"):
+            elif tagname == "/page":
+                self.linecount = linecount
                 self.reset_page()
-        else:
-            tagname = line[1:line.find(">")]
-            if tagname == "page":
+            elif tagname == "page":
                 self.current_page = Page(crawler=self)
             elif self.current_page is not None:
-                if tagname == "id":  # most common tag
-                    this_id = self.get_oneline_tag(line)
-                    self.process_id_tag(this_id)
-                elif tagname == "revision":
-                    self.current_revision = Revision(crawler=self)
-                elif tagname == "contributor":
-                    self.current_user = User(crawler=self)
-                elif tagname == "username":
-                    username = self.get_oneline_tag(line)
-                    self.current_user.add_name(username)
-                elif tagname == "ip":
-                    ip = self.get_oneline_tag(line)
-                    self.process_ip_tag(ip)
-                elif tagname == "timestamp":
-                    timestamp = self.get_oneline_tag(line)
-                    self.current_revision.add_month(timestamp)
-                elif tagname == "sha1":
-                    hashed = self.get_oneline_tag(line)
-                    self.current_revision.sha1 = hashed
-                elif tagname == "ns":
-                    namespace = self.get_oneline_tag(line)
-                    self.current_page.namespace = namespace
-                    if namespace != "0":
-                        if self.mainspace_only:
-                            self.current_page = None
-                elif tagname == "title":
-                    title = self.get_oneline_tag(line)
-                    if title != "":
-                        self.current_page.name = title
-                elif tagname[:8] == "redirect":
-                    self.current_page.is_redirect = True
-                elif tagname[:19] == "contributor deleted":
-                    self.create_deleted_user()
-                    self.deleted_user_edits += 1
+                handler = start_handlers.get(tagname)
+                if handler is None and " " in tagname:
+                    # with attributes, as in <redirect title="..." />
+                    handler = start_handlers.get(tagname.partition(" ")[0])
+                if handler is not None:
+                    self.linecount = linecount
+                    handler(tagname)
+        self.linecount = linecount
+
+    def read_chunks(self, chunks, stop):
+        """Read self.handle in 1 MiB chunks onto the
+        chunks queue until end of file (signalled by an
+        empty chunk) or until stop is set. Runs in a
+        background thread so disk reads overlap parsing.
+        If a read fails, the exception is queued instead,
+        for process_file() to raise."""
+        try:
+            while not stop.is_set():
+                chunk = self.handle.read(1 << 20)
+                chunks.put(chunk)
+                if not chunk:
+                    break
+        except Exception as e:
+            chunks.put(e)
 
     def process_file(self):
-        """iterate through the open file at self.handle"""
+        """Process the open file at self.handle line by
+        line, reading ahead in another thread. Each chunk
+        is decoded and split up to its last newline in one
+        go; the rest is carried over to the next chunk."""
         if not hasattr(self.handle, "closed"):
             raise IOError
         if self.handle.closed:
             raise IOError
+        maxlines = self.maxlines
+        chunks = Queue(maxsize=8)
+        stop = Event()
+        reader = Thread(target=self.read_chunks,
+                        args=(chunks, stop),
+                        daemon=True)
         with self.handle:
-            for line in self.handle:
-                self.process_line(line)
-                self.linecount += 1
-                if self.maxlines is not None:
-                    if self.linecount > self.maxlines:
+            reader.start()
+            try:
+                rest = b""
+                while True:
+                    chunk = chunks.get()
+                    if isinstance(chunk, Exception):
+                        raise chunk
+                    if chunk:
+                        data = rest + chunk
+                        cut = data.rfind(b"\n")
+                        if cut == -1:
+                            rest = data
+                            continue
+                        data, rest = data[:cut], data[cut + 1:]
+                    else:
+                        data, rest = rest, b""
+                        if not data:
+                            break
+                    lines = data.decode("utf-8").split("\n")
+                    if maxlines is not None:
+                        # lines up to maxlines + 1 are crawled in full
+                        lines = lines[:maxlines + 1 - self.linecount]
+                    self.process_lines(lines, self.linecount)
+                    if maxlines is not None and self.linecount > maxlines:
                         break
+                    if not chunk:
+                        break
+            finally:
+                stop.set()
+                while reader.is_alive():  # unblock a full queue
+                    try:
+                        chunks.get(timeout=0.1)
+                    except Empty:
+                        pass
+
+    def open_dump(self):
+        """Open the dump for reading, or only the
+        slice of it given by byte_range."""
+        if self.byte_range is None:
+            return open(self.filepath, "rb", buffering=0)
+        start, end = self.byte_range
+        return DumpSlice(self.filepath, start, end)
 
     def end_crawl(self):
         """Close all open files at end of crawl."""
-        now = datetime.today().isoformat()
+        now = get_timestamp()
         message = "Ended run at {}".format(now)
         self.log(message)
         self.close_outputs()
+        self.stop_log_thread()
         self.loghandle.close()
 
     def crawl(self,
@@ -588,7 +803,7 @@ class Crawler:
               mainspace_only=None):
         """Crawl over stub-meta-history dump until
         reaching either maxlines or end of file."""
-        self.handle = open(self.filepath, encoding="utf-8")
+        self.handle = self.open_dump()
         if maxlines is not None:
             self.maxlines = maxlines
         if mainspace_only is not None:
@@ -596,21 +811,191 @@ class Crawler:
         if logpath is not None:
             handle = open(logpath, "a", encoding="utf-8")
             self.loghandle = handle
-            now = datetime.today().isoformat()
+            self.start_log_thread()
+            now = get_timestamp()
             message = "Started run at " + now
             self.log(message)
         self.linecount = 0
         if not self.split_by_year:
             self.activate_outputs()
+            buffers = self.output_buffers
+            self.users_buffer = buffers["users_output.csv"]
+            self.pages_buffer = buffers["pages_output.csv"]
+            self.rows_buffer = buffers["user_page_months_output.csv"]
         try:
             self.process_file()
         except KeyboardInterrupt:
-            now = datetime.today().isoformat()
+            now = get_timestamp()
             m = "Terminating on keyboard interrupt at {}"
             message = m.format(now)
             self.log(message)
+        finally:
+            # also on errors, so everything logged so far is kept
+            self.stop_log_thread()
+            if self.loghandle is not None:
+                self.loghandle.flush()
         self.end_crawl()
 
+    def crawl_parallel(self, workers=None, logpath="log.txt"):
+        """Crawl the dump in up to `workers` processes,
+        each over its own run of whole pages and into its
+        own part directory, then merge the parts into
+        output_directory."""
+        if workers is None:
+            workers = cpu_count() or 1
+        if logpath is not None:
+            self.loghandle = open(logpath, "a", encoding="utf-8")
+            self.start_log_thread()
+            now = get_timestamp()
+            message = "Started parallel run at " + now
+            self.log(message)
+        offsets = find_page_offsets(self.filepath, workers)
+        ends = offsets[1:] + [getsize(self.filepath)]
+        if not exists(self.output_directory):
+            mkdir(self.output_directory)
+        settings = {"filepath": self.filepath,
+                    "mainspace_only": self.mainspace_only,
+                    "split_by_year": self.split_by_year}
+        part_directories = []
+        try:
+            # fresh directories, so no existing ones are reused or removed
+            for index in range(len(offsets)):
+                prefix = "part{}-".format(index)
+                part_directories.append(mkdtemp(prefix=prefix,
+                                                dir=self.output_directory))
+            m = "Crawling {} parts in {} processes"
+            self.log(m.format(len(offsets), workers))
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = [pool.submit(crawl_part, settings,
+                                       directory, start, end)
+                           for directory, start, end
+                           in zip(part_directories, offsets, ends)]
+                results = [future.result() for future in futures]
+            part_ip2ids = []
+            for part_ip2id, revcount in results:
+                part_ip2ids.append(part_ip2id)
+                self.revcount += revcount
+            self.merge_parts(part_directories, part_ip2ids)
+        finally:
+            # part logs are appended after any queued messages
+            self.stop_log_thread()
+            for directory in part_directories:
+                part_log = join(directory, "log.txt")
+                if self.loghandle is not None and exists(part_log):
+                    with open(part_log, encoding="utf-8") as lines:
+                        copyfileobj(lines, self.loghandle)
+                rmtree(directory, ignore_errors=True)
+            if self.loghandle is not None:
+                self.loghandle.flush()
+        if self.loghandle is not None:
+            m = "Ended parallel run at {} after {} revisions"
+            self.log(m.format(get_timestamp(), self.revcount))
+            self.loghandle.close()
+
+    def merge_parts(self, part_directories, part_ip2ids):
+        """Concatenate the CSV outputs of crawl_part()
+        runs into output_directory, in order. IP users are
+        renumbered so that each IP keeps a single ID, and
+        users already written by an earlier part are
+        dropped."""
+        id_maps = []
+        for part_ip2id in part_ip2ids:
+            id_map = {}
+            for ip, part_id in part_ip2id.items():
+                if ip not in self.ip2id:
+                    self.ip_count += 1
+                    self.ip2id[ip] = "IP:{}".format(self.ip_count)
+                id_map[part_id.encode("ascii")] = \
+                    self.ip2id[ip].encode("ascii")
+            id_maps.append(id_map)
+        filenames = set()
+        for directory in part_directories:
+            filenames.update(f for f in listdir(directory)
+                             if f.endswith(".csv"))
+        for filename in sorted(filenames):
+            filepath = join(self.output_directory, filename)
+            fresh = self.overwrite or not exists(filepath)
+            written_ids = set()
+            with open(filepath, "wb" if fresh else "ab",
+                      buffering=1 << 20) as output:
+                for directory, id_map in zip(part_directories, id_maps):
+                    part_path = join(directory, filename)
+                    if not exists(part_path):
+                        continue
+                    with open(part_path, "rb") as lines:
+                        header = lines.readline()
+                        if fresh:
+                            output.write(header)
+                            fresh = False
+                        if filename == "pages_output.csv":
+                            copyfileobj(lines, output)
+                            continue
+                        for line in lines:
+                            if line.startswith(b"IP:"):
+                                part_id, rest = line.split(b",", 1)
+                                user_id = id_map[part_id]
+                                line = user_id + b"," + rest
+                            elif filename == "users_output.csv":
+                                user_id = line.split(b",", 1)[0]
+                            else:
+                                output.write(line)
+                                continue
+                            if filename == "users_output.csv":
+                                if user_id in written_ids:
+                                    continue
+                                written_ids.add(user_id)
+                            output.write(line)
+
+
+def crawl_part(settings, output_directory, start, end):
+    """Crawl the slice of a dump between byte offsets
+    start and end into output_directory, for use as a
+    ProcessPoolExecutor task. Crawler keyword arguments
+    come from settings. Return the part's IP-to-ID
+    mapping and revision count for merging."""
+    crawler = Crawler(output_directory=output_directory,
+                      log_to_console=False,
+                      overwrite=True,
+                      **settings)
+    crawler.byte_range = (start, end)
+    if not exists(output_directory):
+        mkdir(output_directory)
+    crawler.crawl(logpath=join(output_directory, "log.txt"))
+    return crawler.ip2id, crawler.revcount
+
+
+def find_page_offsets(filepath, parts):
+    """Return sorted byte offsets splitting the dump at
+    filepath into at most `parts` slices of whole pages.
+    The first offset is 0; each other is that of a <page>
+    tag."""
+    offsets = [0]
+    size = getsize(filepath)
+    if size == 0:
+        return offsets
+    with open(filepath, "rb") as handle, \
+            mmap(handle.fileno(), 0, access=ACCESS_READ) as mapped:
+        for index in range(1, parts):
+            target = max(size * index // parts, offsets[-1] + 1)
+            offset = mapped.find(b"<page>", target)
+            if offset == -1:
+                break
+            offsets.append(offset)
+    return offsets
+
+
+def get_timestamp():
+    """Return current local time as an
+    ISO 8601 string, to the second."""
+    return strftime("%Y-%m-%dT%H:%M:%S")
+
+
+def hash_ip(ip):
+    """Return the SHA1 of an IP address as an
+    unpadded base-64 string."""
+    hashed_ip = sha1(ip.encode("utf-8"), usedforsecurity=False)
+    return b64encode_as_string(hashed_ip.digest()).rstrip("=")
+
 
 def get_output_filename(output_name, year=None):
     """For a given output of Crawler,
@@ -648,18 +1033,29 @@ def main(args):
     parser.add_argument("--maxlines",
                         default=None,
                         dest="maxlines",
+                        type=int,
                         help="Maximum number of lines to read from dump")
     parser.add_argument("--no-overwrite",
                         default=True,
                         action="store_false",
                         dest="overwrite",
                         help="Append to existing CSV files rather than overwriting")
+    parser.add_argument("-w", "--workers",
+                        default=None,
+                        type=int,
+                        dest="workers",
+                        help="Crawl in this many parallel processes")
     parsed = parser.parse_args(args)
+    if parsed.workers is not None and parsed.maxlines is not None:
+        parser.error("--maxlines cannot be used with --workers")
     crawler = Crawler(filepath=parsed.filepath,
                       log_to_console=parsed.log_to_console,
                       mainspace_only=parsed.mainspace_only,
                       overwrite=parsed.overwrite)
-    crawler.crawl(maxlines=parsed.maxlines)
+    if parsed.workers is not None:
+        crawler.crawl_parallel(workers=parsed.workers)
+    else:
+        crawler.crawl(maxlines=parsed.maxlines)
 
 
 if __name__ == "__main__":
@@ -115,8 +115,6 @@ class BasicStats:
         self.total_revisions += count
         self.page_ids.add(lineobj.page_id)
         self.user_ids.add(lineobj.user_id)
-        user_month = (lineobj.user_id, lineobj.month)
-        page_month = (lineobj.page_id, lineobj.month)
         self.edits_by_namespace[lineobj.namespace] += count
         if count > self.current_peaks[lineobj.namespace]:
             self.peak_user_page_months[lineobj.namespace] = \
@@ -124,6 +122,8 @@ class BasicStats:
             self.current_peaks[lineobj.namespace] = count
         if lineobj.namespace == "0":
             self.mainspace_page_ids.add(lineobj.page_id)
+            user_month = (lineobj.user_id, lineobj.month)
+            page_month = (lineobj.page_id, lineobj.month)
             self.mainspace_user_months.add(user_month)
             self.mainspace_page_months.add(page_month)
 
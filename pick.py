@@ -2,32 +2,54 @@
 data from CSVs generated by crawl.py"""
 
 from base64 import b64encode
+from bisect import bisect_right
 from collections import defaultdict, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from hashlib import sha1
+from os import makedirs, remove, replace, scandir, stat
+from os.path import abspath, exists, join
+from pickle import dump, load
+from tempfile import mkstemp
+import re
+
+# years in upm filenames, and any four digits:
+YEAR_PATTERN = re.compile("[12][09]\\d\\d")
+FOUR_DIGIT_PATTERN = re.compile("\\d{4}")
+
+
+class UserPageMonthLine(namedtuple("UserPageMonthLine",
+                                   ["user_id", "page_id", "namespace",
+                                    "page_is_redirect", "month",
+                                    "month_edits"])):
+    """Holds data from a single user-page-month CSV line.
+    All field values are strings, or None if missing."""
 
+    __slots__ = ()
 
-class UserPageMonthLine:
-    """Holds data from a single user-page-month CSV line.
-    All attribute values are strings."""
-
-    def __init__(self):
-        self.attrs = ["user_id", "page_id", "namespace",
-                      "page_is_redirect", "month",
-                      "month_edits"]
-        for attrname in self.attrs:
-            setattr(self, attrname, None)
-        self.text = ""
-
-    def from_csv(self, csv_line):
-        """Fill in values from provided CSV line"""
-        csv = csv_line.strip()
-        self.text = csv
-        if not csv.startswith("IP:"):
-            if not csv[0].isnumeric():
-                return
-        pieces = csv.split(",")
-        paired = zip(self.attrs, pieces)
-        for attrname, val in paired:
-            setattr(self, attrname, val)
+    @classmethod
+    def from_csv(cls, csv_line):
+        """Return line object for provided CSV line,
+        with all fields None if it is not a data line."""
+        if not csv_line[:1].isnumeric():
+            if not csv_line.startswith("IP:"):
+                return BLANK_LINE
+        pieces = csv_line.rstrip().split(",")
+        if len(pieces) != 6:
+            pieces = (pieces + [None] * 6)[:6]
+        # tuple.__new__ skips the length check done by _make
+        return tuple.__new__(cls, pieces)
+
+
+BLANK_LINE = UserPageMonthLine(*[None] * 6)
+
+Results = namedtuple("Results",
+                     ["num_users", "num_ips",
+                      "num_pages", "num_redirects",
+                      "num_user_upm", "num_ip_upm",
+                      "num_user_edits", "num_ip_edits"])
+
+BandData = namedtuple("BandData",
+                      ["name", "member_count", "edit_count"])
 
 
 class BandInfo:
@@ -44,8 +66,6 @@ class BandInfo:
         self.edit_count = 0
 
     def tuplify(self):
-        BandData = namedtuple("BandData",
-                              ["name", "member_count", "edit_count"])
         output = BandData(self.name, len(self.members),
                           self.edit_count)
         return output
@@ -65,11 +85,14 @@ class Picker:
             raise ValueError
         else:
             self.filepaths = filepaths
-        self.namespaces = namespaces
+        if namespaces is None:
+            self.namespaces = None
+        else:
+            self.namespaces = frozenset(namespaces)
         if bots is None:
-            self.bots = set()
+            self.bots = frozenset()
         else:
-            self.bots = set(bots)
+            self.bots = frozenset(bots)
         # whether to omit redirects from
         # page edit count:
         self.skip_redirects = True
@@ -117,6 +140,31 @@ class Picker:
                {}".format(editcount))
         return None
 
+    def get_band_totals(self, member_edits, base=10, banded=None):
+        """Given a {member : editcount} dict, return
+        ({band : edits}, {band : members}) dicts covering
+        every band, with bands as in get_edit_band(). Bands
+        are found by bisecting precomputed band limits. If
+        banded is a dict, record each member's band in it."""
+        limits = []
+        for band in self.bands:
+            if band is None:
+                break
+            limits.append(base ** band)
+        labels = self.bands[:len(limits)] + [None]
+        band_edits = dict.fromkeys(labels, 0)
+        band_members = dict.fromkeys(labels, 0)
+        for member, edits in member_edits.items():
+            if edits < 1:
+                print("Warning! Bad edit count {}"
+                      .format(edits))
+            band = labels[bisect_right(limits, edits)]
+            band_edits[band] += edits
+            band_members[band] += 1
+            if banded is not None:
+                banded[member] = band
+        return band_edits, band_members
+
     def get_monthly_edits_by_band(self,
                                   filepath=None,
                                   banded_users=None):
@@ -129,17 +177,18 @@ class Picker:
             banded_users = self.banded_users
         user_ids = set(banded_users.keys())
         banded_data = defaultdict(BandInfo)
-        for line in open(filepath):
-            lineobj = self.process_line(line)
-            if not self.line_is_ok(lineobj):
-                continue
-            if lineobj.user_id in user_ids:
-                month = lineobj.month
-                band = banded_users[lineobj.user_id]
-                band_data = banded_data[(month, band)]
-                edits = int(lineobj.month_edits)
-                band_data.edit_count += edits
-                band_data.members.add(lineobj.user_id)
+        with open_upm_file(filepath) as band_file:
+            for line in band_file:
+                lineobj = self.process_line(line)
+                if not self.line_is_ok(lineobj):
+                    continue
+                if lineobj.user_id in user_ids:
+                    month = lineobj.month
+                    band = banded_users[lineobj.user_id]
+                    band_data = banded_data[(month, band)]
+                    edits = int(lineobj.month_edits)
+                    band_data.edit_count += edits
+                    band_data.members.add(lineobj.user_id)
         final_data = {}  # use a standard dict to return data
         for band_label, band_data in banded_data.items():
             band_data.name = band_label
@@ -155,8 +204,8 @@ class Picker:
             filepaths = self.filepaths
         for path in filepaths:
             print("Processing {}".format(path))
-            handle = open(path, encoding="utf-8")
-            result = self.process_file(handle)
+            with open_upm_file(path) as handle:
+                result = self.process_file(handle)
             self.basic_counts[path] = result
         return self.user_edits
 
@@ -169,8 +218,8 @@ class Picker:
             filepaths = self.filepaths
         for path in filepaths:
             print("Processing {}".format(path))
-            handle = open(path, encoding="utf-8")
-            result = self.process_file(handle)
+            with open_upm_file(path) as handle:
+                result = self.process_file(handle)
             self.basic_counts[path] = result
         return self.page_edits
 
@@ -178,9 +227,12 @@ class Picker:
         """Given a single filepath, return a set of
         all page IDs edited in a given month"""
         page_ids = set()
-        page_file = open(filepath)
+        page_file = open_upm_file(filepath)
         with page_file:
             for line in page_file:
+                # only the month field contains "-"
+                if month not in line:
+                    continue
                 lineobj = self.process_line(line)
                 if not self.line_is_ok(lineobj):
                     continue
@@ -195,9 +247,11 @@ class Picker:
         if not self.bots:
             print("Warning! Getting users without excluding bots.")
         users = set()
-        user_file = open(filepath)
+        user_file = open_upm_file(filepath)
         with user_file:
             for line in user_file:
+                if line.startswith("IP:"):
+                    continue
                 lineobj = self.process_line(line)
                 user_id = lineobj.user_id
                 namespace = lineobj.namespace
@@ -205,9 +259,8 @@ class Picker:
                     continue
                 if user_id is None:
                     continue
-                if self.bots is not None:
-                    if lineobj.user_id in self.bots:
-                        continue
+                if lineobj.user_id in self.bots:
+                    continue
                 if user_id.startswith("IP:"):
                     continue
                 users.add(user_id)
@@ -230,9 +283,9 @@ class Picker:
             filepaths = self.filepaths
         for path in filepaths:
             print("Processing {}".format(path))
-            handle = open(path, encoding="utf-8")
-            result = self.process_file(handle,
-                                       maxlines=maxlines)
+            with open_upm_file(path) as handle:
+                result = self.process_file(handle,
+                                           maxlines=maxlines)
             if self.by_month:  # avoid dict of dicts
                 result = [(x[0], x[1].get_results()) for x in
                           self.months.items()]
@@ -243,19 +296,20 @@ class Picker:
         """Process provided open_file up to maxlines,
         and return resulting stats as namedtuple."""
         self.inc = -1
-        for line in open_file:
-            self.inc += 1
+        # bound once, outside the per-line loop:
+        process_line = self.process_line
+        process_lineobj = self.process_lineobj
+        for inc, line in enumerate(open_file):
+            self.inc = inc  # for line_is_ok() warnings
             if not line:
                 continue
             if maxlines is not None:
-                if self.inc > maxlines:
+                if inc > maxlines:
                     break
-            lineobj = self.process_line(line)
-            self.process_lineobj(lineobj)
+            process_lineobj(process_line(line))
         if self.by_month:
             result = {}
             for month, picker in self.months.items():
-                picker.bots = self.bots
                 monthly_result = picker.get_results()
                 result[month] = monthly_result
         else:
@@ -265,11 +319,6 @@ class Picker:
     def get_results(self):
         """Generate a Results namedtuple
         from the Picker's basic stats."""
-        Results = namedtuple("Results",
-                             ["num_users", "num_ips",
-                              "num_pages", "num_redirects",
-                              "num_user_upm", "num_ip_upm",
-                              "num_user_edits", "num_ip_edits"])
         result = Results(num_users=len(self.user_ids),
                          num_ips=len(self.ips),
                          num_pages=len(self.page_ids),
@@ -280,28 +329,27 @@ class Picker:
                          num_ip_edits=self.num_ip_edits)
         return result
 
-    def process_ip(self, lineobj):
+    def process_ip(self, lineobj, editcount):
         """Increment counts for IP and add IP to self.ips"""
         self.num_ip_upm += 1
-        self.num_ip_edits += int(lineobj.month_edits)
+        self.num_ip_edits += editcount
         self.ips.add(lineobj.user_id)
 
-    def process_user(self, lineobj):
+    def process_user(self, lineobj, editcount):
         """Increment counts for user and add user to
         self.user_ids. If user_edits is set, update."""
         self.num_user_upm += 1
-        editcount = int(lineobj.month_edits)
         self.num_user_edits += editcount
         user = lineobj.user_id
         self.user_ids.add(user)
         if self.user_edits is not None:
             self.user_edits[user] += editcount
 
-    def process_page(self, lineobj):
+    def process_page(self, lineobj, editcount):
         """Increment counts for page and add page to
         self.page_ids."""
         page = lineobj.page_id
-        is_redirect = bool(int(lineobj.page_is_redirect))
+        is_redirect = lineobj.page_is_redirect != "0"
         if is_redirect is False:
             self.page_ids.add(page)
         else:
@@ -310,7 +358,6 @@ class Picker:
             if self.skip_redirects is True and is_redirect:
                 return
             else:
-                editcount = int(lineobj.month_edits)
                 self.page_edits[page] += editcount
 
     def line_is_ok(self, lineobj):
@@ -332,75 +379,83 @@ class Picker:
     def process_line(line):
         """Process line into object and send for
         further processing."""
-        lineobj = UserPageMonthLine()
-        lineobj.from_csv(line)
-        return lineobj
+        return UserPageMonthLine.from_csv(line)
 
     def process_lineobj(self, lineobj):
-        """Increment relevant stats for line"""
-        if self.by_month:
-            picker = self.months[lineobj.month]
-            picker.process_lineobj(lineobj)
+        """Increment relevant stats for line, and for
+        its month if counting by month"""
         if not self.line_is_ok(lineobj):
             return
+        editcount = int(lineobj.month_edits)  # parsed once per line
+        self.count_line(lineobj, editcount)
+        if self.by_month:
+            # filtered like the totals, so months sum to them
+            picker = self.months[lineobj.month]
+            picker.count_line(lineobj, editcount)
+
+    def count_line(self, lineobj, editcount):
+        """Increment stats for a line that has
+        already passed line_is_ok()"""
         if lineobj.user_id.startswith("IP:"):
-            self.process_ip(lineobj)
+            self.process_ip(lineobj, editcount)
         else:  # non-bot registered user
-            self.process_user(lineobj)
-        self.process_page(lineobj)
+            self.process_user(lineobj, editcount)
+        self.process_page(lineobj, editcount)
+
+
+def open_upm_file(path):
+    """Open a user-page-month CSV for reading, as
+    UTF-8 text with a 1 MiB buffer."""
+    return open(path, encoding="utf-8", buffering=1 << 20)
 
 
 def get_bot_ids(botpath, userpath):
     """Given a file with bot usernames each on one
     line, and another file with mappings between
     user_IDs and usernames, return set of bots."""
-    botfile = open(botpath, "rb")
     bot_names = set()
-    for line in botfile:
-        line = line.rstrip()
-        if not line:
-            continue
-        line = line.replace(b"_", b" ")
-        encoded_name = b64encode(line)
-        bot_names.add(encoded_name)
+    with open(botpath, "rb") as botfile:
+        for line in botfile:
+            line = line.rstrip()
+            if not line:
+                continue
+            line = line.replace(b"_", b" ")
+            # names in userpath are base-64 encoded
+            encoded_name = b64encode(line)
+            bot_names.add(encoded_name)
     bot_ids = set()
-    user_file = open(userpath, "rb")
-    for line in user_file:
-        if line.startswith(b"IP:"):
-            continue
-        line = line.rstrip()
-        user_id, user_name = line.split(b",")
-        if user_name in bot_names:
-            decoded_id = user_id.decode("utf-8")
-            bot_ids.add(decoded_id)
-            bot_names.remove(user_name)
+    with open(userpath, "rb") as user_file:
+        for line in user_file:
+            if line.startswith(b"IP:"):
+                continue
+            line = line.rstrip()
+            user_id, user_name = line.split(b",")
+            if user_name in bot_names:
+                decoded_id = user_id.decode("utf-8")
+                bot_ids.add(decoded_id)
+                bot_names.remove(user_name)
+                if not bot_names:  # all bots found
+                    break
     return bot_ids
 
 
 def fields2line(fields):
     """Create CSV line from 'fields', ending
     with newline."""
-    fields = [x.strip().replace(",", "\\,")
-              for x in fields]
-    line = ",".join(fields)
-    line += "\n"
-    return line
+    line = ",".join(x.strip().replace(",", "\\,")
+                    for x in fields)
+    return line + "\n"
 
 
 def get_upm_files(directory):
     """Given a directory, return a sorted
     list of paths to CSV files with
     "user_page_month" in filename."""
-    from os import listdir
-    from os.path import join
-    upm_files = []
-    for filename in listdir(directory):
-        if not filename.endswith(".csv"):
-            continue
-        if not "user_page_month" in filename:
-            continue
-        filepath = join(directory, filename)
-        upm_files.append(filepath)
+    with scandir(directory) as entries:
+        upm_files = [entry.path for entry in entries
+                     if entry.name.endswith(".csv")
+                     and "user_page_month" in entry.name
+                     and entry.is_file()]
     upm_files.sort()
     return upm_files
 
@@ -409,18 +464,15 @@ def stats2csv(stats, unit_name="year"):
     """Given a {unit : data} dict, where data is a
     namedtuple and unit is a year or month, return
     CSV text."""
-    csv = ""
     headers = [unit_name]
-    data = list(stats.values())[0]
-    headers.extend(list(data._fields))
-    first_line = fields2line(headers)
-    csv += first_line
+    data = next(iter(stats.values()))
+    headers.extend(data._fields)
+    lines = [fields2line(headers)]
     for year, data in stats.items():
-        values = [year] + list(data)
-        values = [str(x) for x in values]
-        line = fields2line(values)
-        csv += line
-    return csv
+        values = [str(year)]
+        values.extend(str(x) for x in data)
+        lines.append(fields2line(values))
+    return "".join(lines)
 
 
 def load_all_upms(filepath):
@@ -428,11 +480,10 @@ def load_all_upms(filepath):
     return a set of all user-page-months and complain
     if any dups are found."""
     all_upms = set()
-    upm_file = open(filepath)
+    upm_file = open_upm_file(filepath)
     with upm_file:
         for line in upm_file:
-            lineobj = UserPageMonthLine()
-            lineobj.from_csv(line)
+            lineobj = UserPageMonthLine.from_csv(line)
             if lineobj.user_id is None:
                 continue
             upm = (lineobj.user_id, lineobj.page_id, lineobj.month)
@@ -445,8 +496,7 @@ def load_all_upms(filepath):
 def file2year(filename):
     """Return year if present in filename,
     otherwise return filename."""
-    from re import search
-    year_finder = search("[12][09]\\d\\d", filename)
+    year_finder = YEAR_PATTERN.search(filename)
     label = filename
     if year_finder:
         label = year_finder.group(0)
@@ -471,10 +521,7 @@ def get_user_ages(users, this_year, user_years):
 def get_user_ages_by_year(directory, bots=None):
     """Get the age distribution of editors editing
     in mainspace during each year."""
-    from os import listdir
-    from os.path import join
-    upm_files = [join(directory, x) for x in
-                 listdir(directory) if "user_page_month" in x]
+    upm_files = get_upm_files(directory)
     user_years = dict()
     user_ages = dict()
     existing_users = set()
@@ -501,13 +548,48 @@ def get_user_ages_by_year(directory, bots=None):
     return user_ages
 
 
+def get_file_user_edits(path, namespaces, bots, cache_directory=None):
+    """Return a {userid : editcount} dict for the single
+    user-page-month file at path, as from get_user_edits().
+    If cache_directory is set, the dict is pickled there
+    and reused for as long as the file's size and mtime,
+    the namespaces and the bots stay the same."""
+    if cache_directory is not None:
+        file_stat = stat(path)
+        key = repr((abspath(path), file_stat.st_size,
+                    file_stat.st_mtime_ns,
+                    sorted(namespaces or []), sorted(bots or [])))
+        cache_name = sha1(key.encode("utf-8")).hexdigest() + ".pickle"
+        cache_path = join(cache_directory, cache_name)
+        if exists(cache_path):
+            with open(cache_path, "rb") as cache_file:
+                return load(cache_file)
+    picker = Picker([path], namespaces, bots)
+    user_edits = dict(picker.get_user_edits())
+    if cache_directory is not None:
+        makedirs(cache_directory, exist_ok=True)
+        # written aside and then renamed, so an interrupted
+        # run never leaves a truncated file under the key
+        handle, temp_path = mkstemp(suffix=".tmp", dir=cache_directory)
+        try:
+            with open(handle, "wb") as cache_file:
+                dump(user_edits, cache_file)
+            replace(temp_path, cache_path)
+        except BaseException:
+            remove(temp_path)
+            raise
+    return user_edits
+
+
 def get_weighted_age_by_year(directory,
                              bots=None,
-                             namespaces=None):
+                             namespaces=None,
+                             cache_directory=None):
     """Get the mean age of editors editing during
     each year, weighted by edits (i.e. over
     all non-bot edits made, the mean editor age).
-    Defaults to mainspace."""
+    Defaults to mainspace. If cache_directory is set,
+    user edit counts are cached there."""
     upm_files = get_upm_files(directory)
     if namespaces is None:
         namespaces = ["0"]
@@ -522,8 +604,8 @@ def get_weighted_age_by_year(directory,
         if not year.isnumeric():
             print("Bad file name: {}".format(u))
             continue
-        picker = Picker(namespaces=namespaces, bots=bots)
-        user_edits = picker.get_user_edits(filepaths=[u])
+        user_edits = get_file_user_edits(u, namespaces, bots,
+                                         cache_directory)
         year_users = set(user_edits.keys())
         new_users = year_users - existing_users
         old_users = existing_users.intersection(year_users)
@@ -545,15 +627,38 @@ def get_weighted_age_by_year(directory,
     return averages
 
 
+def get_file_band_totals(path, namespaces, bots, page_edits=False,
+                         cache_directory=None):
+    """Get totals of edits and users or pages by edit
+    band for the single user-page-month file at path,
+    as ({band : edits}, {band : members}, page_ids).
+    page_ids is only filled in if page_edits is set.
+    User edit counts are cached in cache_directory,
+    if set."""
+    print(path)
+    picker = Picker([path], namespaces, bots)
+    if page_edits is True:
+        picker.skip_redirects = True
+        member_edits = picker.get_page_edits()
+    else:
+        member_edits = get_file_user_edits(path, namespaces, bots,
+                                           cache_directory)
+    band_edits, band_members = picker.get_band_totals(member_edits)
+    return band_edits, band_members, picker.page_ids
+
+
 def get_year_band_totals(directory,
                          bots=None,
                          namespaces=None,
-                         page_edits=False):
+                         page_edits=False,
+                         workers=None,
+                         cache_directory=None):
     """Get yearly totals of edits and users or pages,
     by user/page edit band for that year. If page_edits
     is set, append a list of cumulative pagecounts by year
-    to the results list."""
-    from re import search
+    to the results list. If workers is set, process the
+    yearly files in that many parallel processes. If
+    cache_directory is set, cache user edit counts there."""
     if bots is None:
         print("Warning! Proceeding without bot file.")
         bots = set()
@@ -563,28 +668,24 @@ def get_year_band_totals(directory,
     page_counts = []
     if namespaces is None:  # default to mainspace
         namespaces = ["0"]
-    for p in paths:
-        print(p)
-        picker = Picker([p], namespaces, bots)
-        if page_edits is True:
-            picker.skip_redirects = True
-            member_edits = picker.get_page_edits()
-        else:
-            member_edits = picker.get_user_edits()
-        starter = [(1, 0), (2, 0), (3, 0), (4, 0), (None, 0)]
-        band_edits = dict(starter)
-        band_members = dict(starter)
-        for member, edits in member_edits.items():
-            band = picker.get_edit_band(edits)
-            band_edits[band] += edits
-            band_members[band] += 1
-        year_finder = search("\\d{4}", p)
+    tasks = [(p, namespaces, bots, page_edits, cache_directory)
+             for p in paths]
+    if workers is None:
+        results = (get_file_band_totals(*task) for task in tasks)
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(get_file_band_totals, *task)
+                       for task in tasks]
+            results = [future.result() for future in futures]
+    for p, result in zip(paths, results):
+        band_edits, band_members, page_ids = result
+        year_finder = FOUR_DIGIT_PATTERN.search(p)
         label = p
         if year_finder:
             label = year_finder.group(0)
         if page_edits is True:
             page_count_before = len(all_pages)
-            all_pages |= picker.page_ids
+            all_pages |= page_ids
             page_count_after = len(all_pages)
             new_pages = page_count_after - page_count_before
             if new_pages < 0:
@@ -618,37 +719,29 @@ def get_cross_bands(filepath,
     user_edits = picker.get_user_edits()
     banded_users = dict()
     print(sum(user_edits.values()), picker.num_user_edits)  # should be equal
-    starter = [(1, 0), (2, 0), (3, 0), (4, 0), (None, 0)]
-    band_edits = dict(starter)
-    band_users = dict(starter)
-    for user, edits in user_edits.items():
-        band = picker.get_edit_band(edits)
-        band_edits[band] += edits
-        band_users[band] += 1
-        banded_users[user] = band
+    band_edits, band_users = picker.get_band_totals(user_edits,
+                                                    banded=banded_users)
 #    data1 = (list(band_edits.items()), list(band_users.items()))
     picker2 = Picker([filepath], namespaces2, bots)
     user_edits2 = picker2.get_user_edits()
-    band_edits2 = dict(starter)
-    band_users2 = dict(starter)
+    band_edits2 = dict.fromkeys(band_edits, 0)
+    band_users2 = dict.fromkeys(band_edits, 0)
     for user, edits in user_edits2.items():
-        try:
-            band = banded_users[user]
-        except KeyError:
-            band = 0
-            if 0 not in band_edits2.keys():
-                band_edits2[0] = 0
-                band_users2[0] = 0
+        band = banded_users.get(user, 0)
+        if band not in band_edits2:  # band 0: not in namespaces1
+            band_edits2[band] = 0
+            band_users2[band] = 0
         band_edits2[band] += edits
         band_users2[band] += 1
     data2 = (list(band_edits2.items()), list(band_users2.items()))
     return data2
 
 
-def get_banded_ages(directory, bots=None):
+def get_banded_ages(directory, bots=None, cache_directory=None):
     """Return the age distribution of editors editing
     in mainspace in each edit band during each year,
-    as a {(year,age,band):(users,edits)} dict."""
+    as a {(year,age,band):(users,edits)} dict. If
+    cache_directory is set, cache user edit counts there."""
     upm_paths = get_upm_files(directory)
     banded_ages = dict()
     user_years = dict()
@@ -664,8 +757,8 @@ def get_banded_ages(directory, bots=None):
             print("Bad file name: {}".format(path))
             continue
         picker = Picker(filepaths=[path], namespaces=["0"], bots=bots)
-        picker.skip_redirects = False
-        user_edits = picker.get_user_edits()
+        user_edits = get_file_user_edits(path, ["0"], bots,
+                                         cache_directory)
         band_edits = defaultdict(int)
         band_users = defaultdict(int)
         year_users = set(user_edits.keys())
@@ -675,14 +768,17 @@ def get_banded_ages(directory, bots=None):
         outstr = outstr.format(year, len(year_users),
                                len(new_users), len(old_users))
         print(outstr)
+        year_number = int(year)
         for n in new_users:
-            users2years[n] = int(year)
+            users2years[n] = year_number
+        # Edit counts repeat heavily, so band each distinct count once.
+        bands = {editcount: picker.get_edit_band(editcount)
+                 for editcount in set(user_edits.values())}
         for user, editcount in user_edits.items():
-            user_age = int(year) - users2years[user]
+            user_age = year_number - users2years[user]
             if user_age < 0:
                 print("Warning! Files out of order", path, user)
-            band = picker.get_edit_band(editcount)
-            key = (year, user_age, band)
+            key = (year, user_age, bands[editcount])
             band_edits[key] += editcount
             band_users[key] += 1
         for key, editcount in band_edits.items():
@@ -1,8 +1,23 @@
 """Functions to process and present data that
 load.py loads from CSV files crawl.py creates."""
 
+from bisect import bisect_left
 from collections import defaultdict, namedtuple
-from datetime import date, timedelta
+from functools import lru_cache
+import re
+
+# Dumpster chart template filled in by get_annual_bands(),
+# with a data8 line appended when there are six bands
+DUMPSTER_CHART = """../Dumpster chart
+ | data_max   = {}
+ | table_width = 15
+ | data3  = {}
+ | data4  = {}
+ | data5  = {}
+ | data6  = {}
+ | data7  = {}"""
+# trims a tiny percentage to its first significant digits
+SMALL_PERCENT_PATTERN = re.compile("(0\\.0+[1-9]{1,2}).*")
 
 
 def make_user_table_by_year(yearbands,
@@ -25,9 +40,8 @@ def make_user_table_by_year(yearbands,
     If neither 'users' nor 'yearbands' is provided,
     a blank string is returned.
     """
-    bands = sorted(yearbands.keys())
-    table = "{|class=wikitable"
-    table += """
+    parts = ["{|class=wikitable"]
+    parts.append("""
 |+{}
 |Year
 |1-9 edits
@@ -35,18 +49,16 @@ def make_user_table_by_year(yearbands,
 |100-999 edits
 |1,000-9,999 edits
 |10,000+ edits
-""".format(title)
-    years = sorted(set([x[0] for x in bands]))
-    for y in years:
-        bands_in_year = [x for x in bands if x[0] == y]
-        row = "|-\n|" + y
-        for b in bands_in_year:
-            count = yearbands[b]
-            row += "\n|{}".format(count)
-        row += "\n"
-        table += row
-    table += "|}"
-    return table
+""".format(title))
+    bands_by_year = defaultdict(list)
+    for b in yearbands:
+        bands_by_year[b[0]].append(b)
+    for y in sorted(bands_by_year):
+        bands_in_year = sorted(bands_by_year[y])
+        cells = [y] + [str(yearbands[b]) for b in bands_in_year]
+        parts.append("|-\n|" + "\n|".join(cells) + "\n")
+    parts.append("|}")
+    return "".join(parts)
 
 
 def make_page_table_by_year(yearbands,
@@ -66,9 +78,8 @@ def make_page_table_by_year(yearbands,
     Returns wikitable with user-bands as columns
     and years as rows.
     """
-    bands = sorted(yearbands.keys())
-    table = "{|class=wikitable"
-    table += """
+    parts = ["{|class=wikitable"]
+    parts.append("""
 |+{}
 |Year
 |1-9 edits
@@ -77,21 +88,20 @@ def make_page_table_by_year(yearbands,
 |1,000-9,999 edits
 |10,000-99,999 edits
 |100,000+ edits
-""".format(title)
-    years = sorted(set([x[0] for x in bands]))
-    for y in years:
-        bbb = [x for x in bands if x[0] == y]
-        row = "|-\n|" + y
-        for b in bbb:
-            total = str(yearbands[b])
-            row += "\n|" + total
-        row += "\n"
-        table += row
-        table += "|}"
-    return table
-
-
-def get_y2_users_by_y1_edits(users, stop=None, calendar_year="2021"):
+""".format(title))
+    bands_by_year = defaultdict(list)
+    for b in yearbands:
+        bands_by_year[b[0]].append(b)
+    for y in sorted(bands_by_year):
+        bbb = sorted(bands_by_year[y])
+        cells = [y] + [str(yearbands[b]) for b in bbb]
+        parts.append("|-\n|" + "\n|".join(cells) + "\n")
+    parts.append("|}")
+    return "".join(parts)
+
+
+def get_y2_users_by_y1_edits(users, stop=None, calendar_year="2021",
+                             sorted_months=None):
     """Sorts users into bands based on edit count
     their first 12 months of editing, and returns
     the resulting banded tallies of users and
@@ -107,6 +117,10 @@ def get_y2_users_by_y1_edits(users, stop=None, calendar_year="2021"):
         If specified, number of users to stop at
     calendar_year: str
         Four-digit string of calendar year to be studied.
+    sorted_months: NoneType, dict
+        If specified, dict in which to keep each user's
+        sorted months, keyed by id. Pass the same dict
+        when calling again for other calendar years.
 
     Returns
     -------
@@ -117,46 +131,49 @@ def get_y2_users_by_y1_edits(users, stop=None, calendar_year="2021"):
     """
     if type(calendar_year) != str or len(calendar_year) != 4:
         raise ValueError
-    userbands = defaultdict(int)
-    editbands = defaultdict(int)
+    next_year = str(int(calendar_year) + 1)
+    # [users, edits] per band pair, so each user
+    # costs one lookup
+    pair_totals = defaultdict(lambda: [0, 0])
     user_inc = -1
-    for u in users.values():
+    for user_id, u in users.items():
         user_inc += 1
         if stop is not None:
             if user_inc >= stop:
                 break
-        months = sorted(u.months.keys())
+        if sorted_months is None:
+            months = sorted(u.months.keys())
+        else:
+            months = sorted_months.get(user_id)
+            if months is None:
+                months = sorted(u.months.keys())
+                sorted_months[user_id] = months
         first_month = months[0]
         first_year, mm = first_month.split("-", 1)
         if len(first_year) != 4 or len(mm) != 2:
             raise ValueError
         if first_year >= calendar_year:
             continue
-        nominal_start = date(int(first_year), int(mm), 1)
-        twelve_later = nominal_start + timedelta(365)
-        thirteenth_month = twelve_later.isoformat()[:7]
-        this_month = first_month
-        month_inc = -1
-        edits_in_first_year = 0
-        num_months = len(months)
-        while this_month < thirteenth_month and \
-                month_inc + 1 < num_months:
-            month_inc += 1
-            this_month = months[month_inc]
-            edits_in_first_year += u.months[this_month]
+        thirteenth_month = get_thirteenth_month(first_month)
+        # months is sorted, so both windows are slices;
+        # the first year includes the first month at or
+        # after thirteenth_month
+        first_year_end = bisect_left(months, thirteenth_month) + 1
+        edits_in_first_year = sum(u.months[m] for m
+                                  in months[:first_year_end])
         y1_band = get_banded_count(edits_in_first_year)
-        y2_total = 0
-        for m in months:
-            year = m[:4]
-            if year > calendar_year:
-                break
-            elif year == calendar_year:
-                monthly_edits = u.months[m]
-                y2_total += monthly_edits
+        y2_start = bisect_left(months, calendar_year)
+        y2_end = bisect_left(months, next_year, y2_start)
+        y2_total = sum(u.months[m] for m in months[y2_start:y2_end])
         y2_band = get_banded_count(y2_total)
-        pair_band = (y2_band, y1_band)
-        userbands[pair_band] += 1
-        editbands[pair_band] += y2_total
+        totals = pair_totals[(y2_band, y1_band)]
+        totals[0] += 1
+        totals[1] += y2_total
+    userbands = defaultdict(int)
+    editbands = defaultdict(int)
+    for pair_band, (user_count, edit_count) in pair_totals.items():
+        userbands[pair_band] = user_count
+        editbands[pair_band] = edit_count
     Results = namedtuple("Results",
                          ["banded_users", "banded_edits"])
     output = Results(banded_users=userbands,
@@ -164,6 +181,25 @@ def get_y2_users_by_y1_edits(users, stop=None, calendar_year="2021"):
     return output
 
 
+@lru_cache(maxsize=None)
+def get_thirteenth_month(first_month):
+    """
+    Returns the month twelve months after
+    first_month. Cached, since many users share the
+    same first month.
+        Parameters
+        ----------
+        first_month: str
+            Month in YYYY-MM format
+
+        Returns
+        ---------
+        str
+    """
+    first_year, mm = first_month.split("-", 1)
+    return "{}-{}".format(int(first_year) + 1, mm)
+
+
 def get_banded_count(count):
     """
     Returns a band based on a number (typically a
@@ -225,47 +261,42 @@ def make_combo_table(userbands, editbands,
     Returns wikitable of provided values
     with user and edit values in each cell
     """
-    userbands = dict(userbands)
-    editbands = dict(editbands)
+    # lists of pairs are accepted too; dicts are read as-is
+    if not isinstance(userbands, dict):
+        userbands = dict(userbands)
+    if not isinstance(editbands, dict):
+        editbands = dict(editbands)
     if userbands.keys() != editbands.keys():
-        return ValueError
+        raise ValueError
     if not x_band_labels:
         xxx = set([x[0] for x in userbands.keys()])
         x_band_labels = sorted(xxx)
     if not y_band_labels:
         yyy = set([x[1] for x in userbands.keys()])
         y_band_labels = sorted(yyy)
-    if x_band_suffix:
-        x_band_labels = [str(x) + x_band_suffix
-                         for x in x_band_labels]
-    if y_band_suffix:
-        y_band_labels = [str(x) + y_band_suffix
-                         for x in y_band_labels]
-    table = "{|class=wikitable"
-    table += """
+    # braces doubled, as the template goes through format()
+    cell_template = "|{} users{{{{br}}}}making{{{{br}}}}{} edits\n"
+    # suffixes are for display only; cells are
+    # looked up by the unsuffixed labels
+    parts = ["{|class=wikitable"]
+    parts.append("""
 |+{}
 |
-""".format(title)
+""".format(title))
     for label in x_band_labels:
-        table += "!{}\n".format(label)
-    table += "|-\n"
+        parts.append("!{}{}\n".format(label, x_band_suffix))
+    parts.append("|-\n")
     for y_label in y_band_labels:
-        table += "!{}\n".format(y_label)
+        parts.append("!{}{}\n".format(y_label, y_band_suffix))
         for x_label in x_band_labels:
-            try:
-                cell_user_count = userbands[(x_label, y_label)]
-                cell_edit_count = editbands[(x_label, y_label)]
-            except KeyError:
-                cell_user_count = 0
-                cell_edit_count = 0
-            cell_content = str(cell_user_count) + \
-                " users{{br}}making{{br}}" + str(cell_edit_count) + \
-                " edits"
-            cell = "|{}\n".format(cell_content)
-            table += cell
-        table += "|-\n"
-    table += "|}"
-    return table
+            cell_user_count = userbands.get((x_label, y_label), 0)
+            cell_edit_count = editbands.get((x_label, y_label), 0)
+            cell = cell_template.format(cell_user_count,
+                                        cell_edit_count)
+            parts.append(cell)
+        parts.append("|-\n")
+    parts.append("|}")
+    return "".join(parts)
 
 
 def tuples2table(data, title=""):
@@ -288,22 +319,22 @@ def tuples2table(data, title=""):
     """
     headers = list(data.values())[0]._fields
     first_row_content = [""] + list(headers)
-    table = "{|class=wikitable"
-    table += """
+    parts = ["{|class=wikitable"]
+    parts.append("""
 |+{}
 |-
-""".format(title)
+""".format(title))
     for label in first_row_content:
-        table += "!{}\n".format(label)
-    table += "|-\n"
+        parts.append("!{}\n".format(label))
+    parts.append("|-\n")
     labeled_stats = sorted(data.items())
     for label, stats in labeled_stats:
-        table += "!{}\n".format(label)
+        parts.append("!{}\n".format(label))
         for s in stats:
-            table += "|{}\n".format(s)
-        table += "|-\n"
-    table += "|}"
-    return table
+            parts.append("|{}\n".format(s))
+        parts.append("|-\n")
+    parts.append("|}")
+    return "".join(parts)
 
 
 def double_tuples_to_table(tuple_list,
@@ -321,13 +352,13 @@ def double_tuples_to_table(tuple_list,
     tuple_list.sort(key=lambda x: str(x))
     headers = x_labels
     first_row_content = [""] + headers
-    table = "{|class=wikitable"
-    table += """
+    parts = ["{|class=wikitable"]
+    parts.append("""
 |+{}
 |-
-""".format(title)
+""".format(title))
     for label in first_row_content:
-        table += "!{}\n".format(label)
+        parts.append("!{}\n".format(label))
     y_done = set()
     edit_totals = dict([(x, sum([y[1][1] for y in
                                  tuple_list if y[0][0] == x]))
@@ -337,7 +368,7 @@ def double_tuples_to_table(tuple_list,
         members, edits = vals
         y_label, x_label = labels
         if y_label not in y_done:
-            table += "|-\n!{}\n".format(y_label)
+            parts.append("|-\n!{}\n".format(y_label))
         y_done.add(y_label)
         cell = "|{} {}\n{} edits\n"
         cell_content = cell.format(members, members_name,
@@ -358,9 +389,9 @@ def double_tuples_to_table(tuple_list,
         cell_content = cell_content.strip()
         cell_content = cell_content.replace("\n", "{{br}}\n")
         cell_content += "\n"
-        table += cell_content
-    table += "|-\n|}"
-    return table
+        parts.append(cell_content)
+    parts.append("|-\n|}")
+    return "".join(parts)
 
 
 def get_annual_bands(output):
@@ -368,7 +399,7 @@ def get_annual_bands(output):
     [('year',[(band, user_count)...], [(band, edit_count)...]]
     return wikitable of banded amounts and percentages.
     """
-    table = """{|class=wikitable
+    parts = ["""{|class=wikitable
 |+Number of registered users who made ''n'' extant mainspace edits in each calendar year
 |Year
 |1-9 edits
@@ -379,11 +410,10 @@ def get_annual_bands(output):
 |Percent of all{{br}}registered {{br}}users who edited
 |Percent of all{{br}}edits by {{br}}registered users
 |-
-"""
-    from re import sub
+"""]
     for year, banded_edits, banded_users in output:
         band2edits = dict(banded_edits)
-        table += "|{}\n".format(year)
+        parts.append("|{}\n".format(year))
         edit_percents = {}
         user_percents = {}
         total_edits = sum(band2edits.values())
@@ -401,58 +431,43 @@ def get_annual_bands(output):
             user_percent = round(100 * users / total_users, rounder)
             if user_percent == 0.0 and users > 0:
                 user_percent = "{:.7f}".format(100 * users / total_users)
-                user_percent = sub("(0\\.0+[1-9]{1,2}).*", "\\1", user_percent)
+                user_percent = SMALL_PERCENT_PATTERN.sub("\\1", user_percent)
             edit_percents[band] = edit_percent
             user_percents[band] = user_percent
-            table += "|{}\n".format(text)
+            parts.append("|{}\n".format(text))
         user_max = max([x for x in user_percents.values() if type(x) is float])
         user_values = [user_max] + list(user_percents.values())
-        user_chart = """../Dumpster chart
- | data_max   = {}
- | table_width = 15
- | data3  = {}
- | data4  = {}
- | data5  = {}
- | data6  = {}
- | data7  = {}"""
+        user_chart = DUMPSTER_CHART
         if len(user_percents) > 5:
             user_chart += "\n | data8  = {}"
         user_chart = "{{" + user_chart.format(*user_values) + "}}"
-        table += "|{}\n".format(user_chart)
+        parts.append("|{}\n".format(user_chart))
         edit_max = max(edit_percents.values())
         edit_values = [edit_max] + list(edit_percents.values())
-        edit_chart = """../Dumpster chart
- | data_max   = {}
- | table_width = 15
- | data3  = {}
- | data4  = {}
- | data5  = {}
- | data6  = {}
- | data7  = {}"""
-        edit_chart = "{{" + edit_chart.format(*edit_values) + "}}"
-        table += "|{}\n".format(edit_chart)
-        table += "|-\n"
-    table += "|}"
-    return table
+        edit_chart = "{{" + DUMPSTER_CHART.format(*edit_values) + "}}"
+        parts.append("|{}\n".format(edit_chart))
+        parts.append("|-\n")
+    parts.append("|}")
+    return "".join(parts)
 
 
 def tabulate_years(uuu):
     """Given a dict of user age distributions by year,
     prepare a table with year of first edit in X and
     years since first edit in Y."""
-    table = """{|class=wikitable
+    parts = ["""{|class=wikitable
 |+Number of registered users who made first extant mainspace edit in X who were still editing after Y years.
-"""
+"""]
     years = sorted(uuu.keys())
     for num in range(len(years)):
-        table += "! scope= col | {}\n".format(num)
-    table += "|-\n"
+        parts.append("! scope= col | {}\n".format(num))
+    parts.append("|-\n")
     for year, ages in uuu.items():
         ages.sort()
-        table += "! scope = row | {}\n".format(year)
+        parts.append("! scope = row | {}\n".format(year))
         for age, count in ages:
-            table += "|{}\n".format(count)
-        table += "|-\n"
-    table += "|}"
-    return table
+            parts.append("|{}\n".format(count))
+        parts.append("|-\n")
+    parts.append("|}")
+    return "".join(parts)
  